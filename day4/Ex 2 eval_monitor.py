@@ -7,6 +7,8 @@ import json
 import os
 from datetime import datetime
 from collections import defaultdict
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import matplotlib.pyplot as plt
 
 # ============================================================================
@@ -172,51 +174,73 @@ class EvalDashboard:
         print("✓ Saved trends chart to eval_trends.png")
         plt.show()
     
-    def identify_regressions(self):
-        """Find when performance dropped significantly"""
-        
+    def identify_regressions(self, window=5):
+        """
+        Find when performance dropped significantly
+
+        Compares each run against a rolling baseline (median of the
+        previous `window` runs) instead of just the immediate predecessor.
+        The median baseline is robust to single noisy runs, and the whole
+        comparison is vectorized with NumPy - no Python loop over runs.
+        """
+
         if len(self.history) < 2:
             print("Need at least 2 runs to detect regressions")
             return
-        
+
         print("\n🔍 REGRESSION ANALYSIS")
         print("="*70)
-        
+
+        # Metrics tracked in every run (so the score matrix is rectangular)
+        metric_names = [
+            m for m in self.history[-1]['metrics']
+            if all(m in run['metrics'] for run in self.history)
+        ]
+
+        # Build (runs, metrics) score matrix + pass rate vector in one shot
+        scores = np.array([
+            [run['metrics'][m]['avg_score'] for m in metric_names]
+            for run in self.history
+        ])
+        pass_rates = np.array([
+            run['passed'] / run['total_tests'] for run in self.history
+        ])
+
+        # Rolling baseline: median of the prior `window` runs
+        # (shrink the window for short histories so early runs still get checked)
+        w = min(window, len(self.history) - 1)
+        score_windows = sliding_window_view(scores, w, axis=0)[:-1]
+        baseline = np.median(score_windows, axis=-1)  # (runs - w, metrics)
+        rate_windows = sliding_window_view(pass_rates, w)[:-1]
+        rate_baseline = np.median(rate_windows, axis=-1)
+
         regressions = []
-        
-        for i in range(1, len(self.history)):
-            prev = self.history[i-1]
-            curr = self.history[i]
-            
-            # Check overall pass rate
-            prev_rate = prev['passed'] / prev['total_tests']
-            curr_rate = curr['passed'] / curr['total_tests']
-            
-            if curr_rate < prev_rate - 0.2:  # 20% drop
-                regressions.append({
-                    "run": i,
-                    "timestamp": curr['timestamp'],
-                    "type": "Overall",
-                    "drop": f"{(prev_rate - curr_rate)*100:.1f}%",
-                    "from": prev_rate,
-                    "to": curr_rate
-                })
-            
-            # Check individual metrics
-            for metric in curr['metrics']:
-                if metric in prev['metrics']:
-                    prev_score = prev['metrics'][metric]['avg_score']
-                    curr_score = curr['metrics'][metric]['avg_score']
-                    
-                    if curr_score < prev_score - 0.15:  # 0.15 drop
-                        regressions.append({
-                            "run": i,
-                            "timestamp": curr['timestamp'],
-                            "type": f"{metric.capitalize()}",
-                            "drop": f"{(prev_score - curr_score):.2f}",
-                            "from": prev_score,
-                            "to": curr_score
-                        })
+
+        # Overall pass rate: 20% drop below baseline
+        rate_regress = pass_rates[w:] < rate_baseline - 0.2
+        for row in np.flatnonzero(rate_regress):
+            i = w + row
+            regressions.append({
+                "run": int(i),
+                "timestamp": self.history[i]['timestamp'],
+                "type": "Overall",
+                "drop": f"{(rate_baseline[row] - pass_rates[i])*100:.1f}%",
+                "from": float(rate_baseline[row]),
+                "to": float(pass_rates[i])
+            })
+
+        # Individual metrics: 0.15 drop below baseline
+        rows, cols = np.where(scores[w:] < baseline - 0.15)
+        for row, col in zip(rows, cols):
+            i = w + row
+            regressions.append({
+                "run": int(i),
+                "timestamp": self.history[i]['timestamp'],
+                "type": metric_names[col].capitalize(),
+                "drop": f"{(baseline[row, col] - scores[i, col]):.2f}",
+                "from": float(baseline[row, col]),
+                "to": float(scores[i, col])
+            })
         
         if regressions:
             print(f"Found {len(regressions)} regressions:\n")
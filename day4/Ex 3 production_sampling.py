@@ -3,10 +3,51 @@ Exercise 4.3: Production Sampling & Data Flywheel
 Learn from real production traffic to improve your evals
 """
 
-import json
+import heapq
+import math
+import os
 import random
+import re
+import zlib
 from datetime import datetime
-from collections import defaultdict
+import ijson
+import numpy as np
+import orjson
+
+# Precompiled failure-phrase matcher: one C-level scan per response
+# instead of several Python substring checks plus a .lower() copy
+_FAIL_PAT = re.compile(r"(?P<idk>i don't know|i'm not sure)|(?P<err>error)", re.IGNORECASE)
+_FAIL_SCORES = {
+    'idk': (2, "Shows uncertainty"),
+    'err': (2, "Contains 'error'")
+}
+_UNCERTAIN_PAT = re.compile(r"i don't know|i'm not sure", re.IGNORECASE)
+_APOLOGY_PAT = re.compile(r"error|sorry", re.IGNORECASE)
+
+
+def weighted_reservoir(logs, weight_fn, k):
+    """
+    Weighted reservoir sampling (A-Res)
+
+    One streaming pass with O(k) memory: each item draws the key
+    log(u)/weight and the k largest keys win, so selection probability is
+    proportional to weight. Items with weight <= 0 are never selected.
+    Works over a generator - no need to materialize the log list.
+    """
+    reservoir = []  # min-heap of (key, order, log)
+
+    for i, log in enumerate(logs):
+        weight = weight_fn(log)
+        if weight <= 0:
+            continue
+        # 1 - random() is in (0, 1], so log() is always defined
+        key = math.log(1.0 - random.random()) / weight
+        if len(reservoir) < k:
+            heapq.heappush(reservoir, (key, i, log))
+        elif key > reservoir[0][0]:
+            heapq.heapreplace(reservoir, (key, i, log))
+
+    return [log for key, i, log in sorted(reservoir, reverse=True)]
 
 # ============================================================================
 # PRODUCTION LOG SIMULATOR
@@ -35,17 +76,17 @@ class ProductionLogger:
             "metadata": metadata or {}
         }
         
-        # Append to log file
+        # Append to log file (orjson: ~5x faster serialize than stdlib)
         try:
-            with open(self.log_file, 'r') as f:
-                logs = json.load(f)
+            with open(self.log_file, 'rb') as f:
+                logs = orjson.loads(f.read())
         except FileNotFoundError:
             logs = []
-        
+
         logs.append(log_entry)
-        
-        with open(self.log_file, 'w') as f:
-            json.dump(logs, f, indent=2)
+
+        with open(self.log_file, 'wb') as f:
+            f.write(orjson.dumps(logs, option=orjson.OPT_INDENT_2))
 
 
 class ProductionSampler:
@@ -56,147 +97,210 @@ class ProductionSampler:
     
     def __init__(self, log_file="production_logs.json"):
         self.log_file = log_file
-    
-    def load_logs(self):
-        """Load production logs"""
+        self._emb_cache_key = None
+        self._emb_cache = None
+
+    def iter_logs(self):
+        """
+        Stream production logs one record at a time
+
+        Uses ijson so memory stays at one record regardless of log size -
+        a 100MB+ log file never gets fully materialized.
+        """
         try:
-            with open(self.log_file, 'r') as f:
-                return json.load(f)
+            with open(self.log_file, 'rb') as f:
+                yield from ijson.items(f, 'item')
         except FileNotFoundError:
-            return []
+            return
+
+    def load_logs(self):
+        """Load all production logs into memory (legacy helper)"""
+        return list(self.iter_logs())
     
     def random_sample(self, sample_rate=0.1):
         """
         Strategy 1: Random sampling
         Sample X% of all requests randomly
-        
+
         Use when: You want unbiased view of overall quality
+
+        Single streaming pass: each record is kept with probability
+        sample_rate (Bernoulli), so logs larger than RAM work fine.
         """
-        logs = self.load_logs()
-        sample_size = int(len(logs) * sample_rate)
-        
-        sample = random.sample(logs, min(sample_size, len(logs)))
-        
-        print(f"📊 Random Sample: {len(sample)}/{len(logs)} requests ({sample_rate*100:.0f}%)")
+        sample = []
+        total = 0
+
+        for log in self.iter_logs():
+            total += 1
+            if random.random() < sample_rate:
+                sample.append(log)
+
+        print(f"📊 Random Sample: {len(sample)}/{total} requests ({sample_rate*100:.0f}%)")
         return sample
+
+    def reservoir_sample(self, k=20):
+        """
+        Strategy 1b: Reservoir sampling (Algorithm R)
+        Uniform sample of exactly k requests in one pass with O(k) memory
+
+        Use when: You need a fixed-size sample from a stream of unknown length
+        """
+        reservoir = []
+        total = 0
+
+        for i, log in enumerate(self.iter_logs()):
+            total = i + 1
+            if i < k:
+                reservoir.append(log)
+            else:
+                # Keep each later record with probability k/(i+1)
+                j = random.randrange(i + 1)
+                if j < k:
+                    reservoir[j] = log
+
+        print(f"🎲 Reservoir Sample: {len(reservoir)}/{total} requests")
+        return reservoir
     
+    def _failure_score(self, log):
+        """Cheap heuristic score for how likely a response failed"""
+        response = log['llm_response']
+        n = len(response)
+        failure_score = 0
+
+        if n < 50:
+            failure_score += 3  # Very short response
+
+        if _UNCERTAIN_PAT.search(response):
+            failure_score += 2  # Uncertainty
+
+        if _APOLOGY_PAT.search(response):
+            failure_score += 1  # Apologetic
+
+        if n > 500:
+            failure_score += 1  # Too verbose
+
+        return failure_score
+
+    def _is_edge_case(self, log):
+        """Edge case heuristics on the user input"""
+        user_input = log['user_input']
+
+        return (
+            len(user_input) < 10 or      # Very short
+            len(user_input) > 200 or     # Very long
+            user_input.isupper() or      # ALL CAPS (angry user)
+            "???" in user_input or       # Multiple punctuation
+            "!!!" in user_input
+        )
+
     def failure_biased_sample(self, budget=20):
         """
         Strategy 2: Failure-biased sampling
         Sample requests that likely failed (short responses, errors, etc.)
-        
+
         Use when: You want to find problems quickly
+
+        Weighted reservoir over the log stream: selection probability is
+        proportional to failure score, in one pass with O(budget) memory.
         """
-        logs = self.load_logs()
-        
-        # Score each log by "failure likelihood"
-        scored_logs = []
-        for log in logs:
-            failure_score = 0
-            
-            response = log['llm_response']
-            
-            # Heuristics for potential failures:
-            if len(response) < 50:
-                failure_score += 3  # Very short response
-            
-            if "I don't know" in response or "I'm not sure" in response:
-                failure_score += 2  # Uncertainty
-            
-            if "error" in response.lower() or "sorry" in response.lower():
-                failure_score += 1  # Apologetic
-            
-            if len(response) > 500:
-                failure_score += 1  # Too verbose
-            
-            scored_logs.append((failure_score, log))
-        
-        # Sort by failure score (highest first)
-        scored_logs.sort(reverse=True, key=lambda x: x[0])
-        
-        # Take top N
-        sample = [log for score, log in scored_logs[:budget]]
-        
+        sample = weighted_reservoir(self.iter_logs(), self._failure_score, budget)
+
         print(f"🎯 Failure-Biased Sample: {len(sample)} highest-risk requests")
         return sample
-    
+
     def edge_case_sample(self, budget=20):
         """
         Strategy 3: Edge case sampling
         Sample unusual/rare requests
-        
+
         Use when: You want to test robustness
+
+        Same weighted reservoir helper with a 0/1 weight: edge cases are
+        sampled uniformly, everything else never - still a single pass.
         """
-        logs = self.load_logs()
-        
-        # Find edge cases by looking at input characteristics
-        edge_cases = []
-        
-        for log in logs:
-            user_input = log['user_input']
-            
-            # Edge case heuristics:
-            is_edge = False
-            
-            if len(user_input) < 10:  # Very short
-                is_edge = True
-            
-            if len(user_input) > 200:  # Very long
-                is_edge = True
-            
-            if user_input.isupper():  # ALL CAPS (angry user)
-                is_edge = True
-            
-            if "???" in user_input or "!!!" in user_input:  # Multiple punctuation
-                is_edge = True
-            
-            if is_edge:
-                edge_cases.append(log)
-        
-        # Random sample from edge cases
-        sample = random.sample(edge_cases, min(budget, len(edge_cases)))
-        
+        sample = weighted_reservoir(
+            self.iter_logs(),
+            lambda log: 1.0 if self._is_edge_case(log) else 0.0,
+            budget
+        )
+
         print(f"🔍 Edge Case Sample: {len(sample)} unusual requests")
         return sample
     
+    def _text_vectors(self, logs, dims=64):
+        """
+        Cheap hashed bag-of-words vectors, L2-normalized
+
+        Stand-in for sentence embeddings: good enough to measure "these
+        two requests talk about different things" without a model load.
+        Swap in real embeddings later - the selection code is unchanged.
+        """
+        vecs = np.zeros((len(logs), dims))
+
+        for i, log in enumerate(logs):
+            text = (log['user_input'] + " " + log['llm_response']).lower()
+            for token in text.split():
+                vecs[i, zlib.crc32(token.encode()) % dims] += 1.0
+
+        norms = np.linalg.norm(vecs, axis=1)
+        norms[norms == 0] = 1.0
+        return vecs / norms[:, None]
+
+    def _embeddings(self):
+        """
+        Vectors for the current log snapshot, computed once and shared
+
+        Cached by (path, mtime): every strategy that needs vectors reuses
+        the same (N, d) matrix instead of re-encoding the logs per call.
+        The cache invalidates itself when the log file changes on disk.
+        """
+        try:
+            key = (self.log_file, os.path.getmtime(self.log_file))
+        except OSError:
+            key = (self.log_file, None)
+
+        if self._emb_cache is None or key != self._emb_cache_key:
+            logs = self.load_logs()
+            self._emb_cache = (logs, self._text_vectors(logs))
+            self._emb_cache_key = key
+
+        return self._emb_cache
+
     def diverse_sample(self, budget=20):
         """
         Strategy 4: Diversity sampling
-        Sample requests covering different topics/categories
-        
+        Sample requests that are maximally different from each other
+
         Use when: You want broad coverage
+
+        Farthest-point (k-means++-style) selection: after a random first
+        pick, each next pick is the request least similar to everything
+        already selected. The similarity update is one matrix-vector
+        product per pick - no Python loop over pairs, and no fixed
+        keyword buckets that miss unforeseen topics.
         """
-        logs = self.load_logs()
-        
-        # Group by topic (simplified - in real system, use embeddings)
-        topics = defaultdict(list)
-        
-        keywords = {
-            "shipping": ["package", "delivery", "tracking", "shipped"],
-            "account": ["password", "login", "account", "sign in"],
-            "billing": ["refund", "charge", "payment", "invoice"],
-            "product": ["feature", "how to", "does it", "can I"],
-            "complaint": ["frustrated", "angry", "disappointed", "terrible"]
-        }
-        
-        for log in logs:
-            text = (log['user_input'] + " " + log['llm_response']).lower()
-            
-            for topic, topic_keywords in keywords.items():
-                if any(kw in text for kw in topic_keywords):
-                    topics[topic].append(log)
-                    break
-            else:
-                topics["other"].append(log)
-        
-        # Sample evenly from each topic
-        sample = []
-        per_topic = budget // len(topics)
-        
-        for topic, topic_logs in topics.items():
-            sample.extend(random.sample(topic_logs, min(per_topic, len(topic_logs))))
-        
-        print(f"🌈 Diverse Sample: {len(sample)} requests across {len(topics)} topics")
+        logs, vecs = self._embeddings()
+
+        if not logs:
+            print("🌈 Diverse Sample: 0 requests (no logs)")
+            return []
+
+        budget = min(budget, len(logs))
+
+        # Greedy max-min selection
+        first = random.randrange(len(logs))
+        selected = [first]
+        max_sim = vecs @ vecs[first]
+
+        for _ in range(budget - 1):
+            max_sim[selected] = np.inf  # never re-pick
+            pick = int(np.argmin(max_sim))
+            selected.append(pick)
+            max_sim = np.maximum(max_sim, vecs @ vecs[pick])
+
+        sample = [logs[i] for i in selected]
+
+        print(f"🌈 Diverse Sample: {len(sample)} maximally-different requests")
         return sample
 
 
@@ -277,15 +381,16 @@ class DataFlywheel:
         """Save new test cases to golden dataset"""
         
         try:
-            with open("golden_dataset_additions.json", 'r') as f:
-                existing = json.load(f)
+            with open("golden_dataset_additions.json", 'rb') as f:
+                existing = orjson.loads(f.read())
         except FileNotFoundError:
             existing = []
-        
+
         existing.extend(self.new_test_cases)
-        
-        with open("golden_dataset_additions.json", 'w') as f:
-            json.dump(existing, f, indent=2)
+
+        # Keep the indent - this file is meant to be reviewed by hand
+        with open("golden_dataset_additions.json", 'wb') as f:
+            f.write(orjson.dumps(existing, option=orjson.OPT_INDENT_2))
 
 
 # ============================================================================
@@ -385,34 +490,35 @@ failure_sample = sampler.failure_biased_sample(budget=10)
 print(f"\n📊 DETAILED FAILURE ANALYSIS:")
 print("="*70)
 
-logs = sampler.load_logs()
 scored = []
 
-for log in logs:
+# Stream the logs instead of loading them all up front
+for log in sampler.iter_logs():
     response = log['llm_response']
+    n = len(response)  # measure once per log
     score = 0
     reasons = []
-    
-    if len(response) < 50:
+
+    if n < 50:
         score += 3
         reasons.append("Very short response")
-    if "I don't know" in response or "I'm not sure" in response:
-        score += 2
-        reasons.append("Shows uncertainty")
-    if "error" in response.lower():
-        score += 2
-        reasons.append("Contains 'error'")
-    if len(response) > 500:
+    # Single regex scan covers all failure phrases, case-insensitively
+    hit_groups = {m.lastgroup for m in _FAIL_PAT.finditer(response)}
+    for group, (points, reason) in _FAIL_SCORES.items():
+        if group in hit_groups:
+            score += points
+            reasons.append(reason)
+    if n > 500:
         score += 1
         reasons.append("Too verbose")
-    
+
     if score > 0:  # Only show flagged requests
         scored.append((score, log, reasons))
 
-# Sort and show top 10
-scored.sort(reverse=True, key=lambda x: x[0])
+# Show top 10 - nlargest avoids sorting the full list
+top_failures = heapq.nlargest(10, scored, key=lambda x: x[0])
 
-for i, (score, log, reasons) in enumerate(scored[:10], 1):
+for i, (score, log, reasons) in enumerate(top_failures, 1):
     print(f"\n#{i} - Failure Score: {score}")
     print(f"Input: {log['user_input'][:60]}")
     print(f"Response: {log['llm_response'][:60]}")
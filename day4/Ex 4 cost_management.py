@@ -3,10 +3,39 @@ Exercise 4.4: Cost Management & ROI
 Track eval costs and optimize spending
 """
 
-import json
+import hashlib
+import os
 import time
 from datetime import datetime
-from collections import defaultdict
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+import orjson
+import tiktoken
+
+
+# ============================================================================
+# TOKEN COUNTING
+# ============================================================================
+
+@lru_cache(maxsize=8)
+def _encoding_for(model):
+    """One tiktoken encoding per model, loaded lazily"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@lru_cache(maxsize=50_000)
+def count_tokens(text, model="gpt-4"):
+    """
+    Memoized token count for one (text, model) pair
+
+    Eval harnesses tokenize the same system prompt on every call; the
+    LRU turns every repeat into a dict lookup instead of a BPE encode.
+    """
+    return len(_encoding_for(model).encode(text))
 
 # ============================================================================
 # COST TRACKER
@@ -26,10 +55,14 @@ class CostTracker:
         "gpt-3.5-turbo": {
             "input": 0.001,
             "output": 0.002
+        },
+        "gpt-4o-mini": {
+            "input": 0.00015,
+            "output": 0.0006
         }
     }
     
-    def __init__(self, log_file="cost_tracking.json"):
+    def __init__(self, log_file="cost_tracking.jsonl"):
         self.log_file = log_file
         self.current_run_costs = []
     
@@ -45,7 +78,9 @@ class CostTracker:
         total_cost = input_cost + output_cost
         
         call_data = {
-            "timestamp": datetime.now().isoformat(),
+            # Raw ns timestamp: ~1µs cheaper per call than datetime.now()
+            # .isoformat(); converted to ISO once at save_run flush time
+            "timestamp": time.time_ns(),
             "model": model,
             "metric": metric_name,
             "input_tokens": input_tokens,
@@ -57,11 +92,104 @@ class CostTracker:
         
         return total_cost
     
+    def count_and_log(self, model, prompt, completion, metric_name):
+        """
+        Tokenize real call strings (memoized) and log the cost
+
+        Callers pass the actual prompt/completion text instead of
+        hand-rolling token estimates; repeated prompts hit the
+        count_tokens cache rather than re-encoding.
+        """
+        return self.log_api_call(
+            model,
+            count_tokens(prompt, model),
+            count_tokens(completion, model),
+            metric_name
+        )
+
+    def bind_model(self, model):
+        """
+        Return a cost function specialized for one model
+
+        Pre-scales the per-1K prices to per-token constants captured as
+        closure locals, so a hot loop pays two multiplies and an add per
+        call - no dict lookups and no division.
+        """
+        pricing = self.PRICING.get(model, self.PRICING["gpt-4"])
+        p_in = pricing["input"] / 1000.0
+        p_out = pricing["output"] / 1000.0
+
+        def cost_fn(input_tokens, output_tokens):
+            return input_tokens * p_in + output_tokens * p_out
+
+        return cost_fn
+
+    def log_api_calls_batch(self, model, input_tokens_arr, output_tokens_arr, metric_name):
+        """
+        Log a batch of API calls for one metric
+
+        When token counts are known upfront, one NumPy expression computes
+        every cost and the run log is extended once - no per-call Python
+        arithmetic.
+        """
+        pricing = self.PRICING.get(model, self.PRICING["gpt-4"])
+
+        input_tokens_arr = np.asarray(input_tokens_arr)
+        output_tokens_arr = np.asarray(output_tokens_arr)
+
+        costs = (
+            input_tokens_arr * (pricing["input"] / 1000)
+            + output_tokens_arr * (pricing["output"] / 1000)
+        )
+
+        timestamp = time.time_ns()
+        self.current_run_costs.extend(
+            {
+                "timestamp": timestamp,
+                "model": model,
+                "metric": metric_name,
+                "input_tokens": int(i),
+                "output_tokens": int(o),
+                "cost": float(c)
+            }
+            for i, o, c in zip(input_tokens_arr, output_tokens_arr, costs)
+        )
+
+        return float(costs.sum())
+
+    def log_cache_hit(self, model, metric_name):
+        """
+        Record a zero-cost row for a cache hit
+
+        Hits show up in the history like any other call, so the analytics
+        report measured savings instead of just predicting them.
+        """
+        call_data = {
+            "timestamp": time.time_ns(),
+            "model": model,
+            "metric": metric_name,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cost": 0.0,
+            "cache_hit": True
+        }
+
+        self.current_run_costs.append(call_data)
+
+        return 0.0
+
     def save_run(self, run_metadata):
         """
         Save completed run with all costs
         """
         
+        # Bulk-convert the raw ns timestamps to ISO strings at flush time
+        for call in self.current_run_costs:
+            if isinstance(call["timestamp"], int):
+                call["timestamp"] = datetime.fromtimestamp(
+                    call["timestamp"] / 1e9
+                ).isoformat()
+
         total_cost = sum(call["cost"] for call in self.current_run_costs)
         total_calls = len(self.current_run_costs)
         
@@ -74,30 +202,189 @@ class CostTracker:
             "calls": self.current_run_costs
         }
         
-        # Load existing
-        try:
-            with open(self.log_file, 'r') as f:
-                history = json.load(f)
-        except FileNotFoundError:
-            history = []
-        
-        history.append(run_summary)
-        
-        with open(self.log_file, 'w') as f:
-            json.dump(history, f, indent=2)
-        
+        # Append one JSON line per run (JSONL)
+        # O(1) per save - no loading and rewriting the whole history;
+        # orjson serializes the line ~5x faster than stdlib json
+        with open(self.log_file, 'ab') as f:
+            f.write(orjson.dumps(run_summary) + b'\n')
+
         # Reset for next run
         self.current_run_costs = []
-        
+
         return run_summary
-    
+
     def get_history(self):
-        """Load cost history"""
+        """Stream cost history one run at a time (generator)"""
         try:
-            with open(self.log_file, 'r') as f:
-                return json.load(f)
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    if line.strip():
+                        yield orjson.loads(line)
         except FileNotFoundError:
-            return []
+            return
+
+    def export_parquet(self, path=None):
+        """
+        Export the call-level history to a columnar Parquet file
+
+        One row per API call with columns [timestamp, model, metric,
+        input_tokens, output_tokens, cost]. Dictionary-encoded strings
+        plus zstd compression make this ~5-10x smaller than the JSON
+        log, and analytics tools can read single columns instead of
+        parsing every record. The JSONL file stays the append-only
+        write path; this is the analytics snapshot.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if path is None:
+            path = os.path.splitext(self.log_file)[0] + '.parquet'
+
+        # Columnar accumulation (SoA) straight off the history stream
+        columns = {
+            "timestamp": [], "model": [], "metric": [],
+            "input_tokens": [], "output_tokens": [], "cost": []
+        }
+
+        for run in self.get_history():
+            for call in run["calls"]:
+                for col in columns:
+                    columns[col].append(call[col])
+
+        table = pa.table({
+            "timestamp": pa.array(columns["timestamp"], pa.string()),
+            "model": pa.array(columns["model"], pa.string()).dictionary_encode(),
+            "metric": pa.array(columns["metric"], pa.string()).dictionary_encode(),
+            "input_tokens": pa.array(columns["input_tokens"], pa.int32()),
+            "output_tokens": pa.array(columns["output_tokens"], pa.int32()),
+            "cost": pa.array(columns["cost"], pa.float64())
+        })
+
+        pq.write_table(table, path, compression='zstd')
+
+        print(f"✓ Exported {table.num_rows} call records to {path}")
+        return path
+
+
+# ============================================================================
+# MODEL ROUTER
+# ============================================================================
+
+class ModelRouter:
+    """
+    Route each metric to the cheapest model that can judge it
+
+    Simple metrics (empathy, clarity) go to a cheap judge; complex
+    factual metrics stay on GPT-4. This implements the ~60% routing
+    saving that recommend_optimizations previously only predicted.
+
+    EVAL_MODEL_OVERRIDE in the environment forces one model everywhere,
+    and an optional budget_cap downgrades everything to the cheap tier
+    once the current run's tracked spend crosses the cap.
+    """
+
+    DEFAULT_ROUTES = {
+        "Accuracy": "gpt-4",
+        "Hallucination": "gpt-4",
+        "Empathy": "gpt-3.5-turbo",
+        "Clarity": "gpt-3.5-turbo",
+        "Citation": "gpt-3.5-turbo"
+    }
+
+    def __init__(self, routes=None, default_model="gpt-4",
+                 cheap_model="gpt-3.5-turbo", budget_cap=None, tracker=None):
+        self.routes = dict(self.DEFAULT_ROUTES if routes is None else routes)
+        self.default_model = default_model
+        self.cheap_model = cheap_model
+        self.budget_cap = budget_cap
+        self.tracker = tracker
+
+    def route(self, metric_name):
+        """Pick the model for one metric call"""
+        override = os.environ.get("EVAL_MODEL_OVERRIDE")
+        if override:
+            return override
+
+        # Over budget for this run? Everything drops to the cheap tier
+        if self.budget_cap is not None and self.tracker is not None:
+            run_spend = sum(c["cost"] for c in self.tracker.current_run_costs)
+            if run_spend >= self.budget_cap:
+                return self.cheap_model
+
+        return self.routes.get(metric_name, self.default_model)
+
+
+# ============================================================================
+# EVAL CACHE
+# ============================================================================
+
+class EvalCache:
+    """
+    Exact-match LRU cache for judge-LLM results
+
+    Keyed by (model, metric, prompt hash). On a hit the judge call is
+    skipped entirely and the tracker records a zero-cost row, so the
+    30%+ caching savings that recommend_optimizations predicts actually
+    show up in the measured cost history.
+
+    A semantic second tier (embed the prompt, accept near-duplicates by
+    cosine similarity) can be layered behind get() later; the exact tier
+    alone already covers repeated golden-set cases across runs.
+    """
+
+    def __init__(self, maxsize=100_000):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model, metric, prompt):
+        digest = hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+        return (model, metric, digest)
+
+    def get(self, model, metric, prompt):
+        """Return the cached result, or None on a miss"""
+        key = self._key(model, metric, prompt)
+
+        try:
+            result = self._cache[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._cache.move_to_end(key)  # LRU bookkeeping
+        self.hits += 1
+        return result
+
+    def put(self, model, metric, prompt, result):
+        """Store a judge result, evicting the least recently used entry"""
+        key = self._key(model, metric, prompt)
+
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def get_or_call(self, model, metric, prompt, call_fn, tracker=None):
+        """
+        Wrap a judge call site
+
+        Returns the cached result on a hit (logging a zero-cost row to
+        the tracker), otherwise invokes call_fn() and caches its result.
+        """
+        result = self.get(model, metric, prompt)
+
+        if result is not None:
+            if tracker is not None:
+                tracker.log_cache_hit(model, metric)
+            return result
+
+        result = call_fn()
+        self.put(model, metric, prompt, result)
+
+        return result
 
 
 # ============================================================================
@@ -111,65 +398,119 @@ class CostOptimizer:
     
     def __init__(self, tracker: CostTracker):
         self.tracker = tracker
-    
+        self._agg_cache = None
+        self._agg_mtime = None
+
+    def _aggregate(self):
+        """
+        Single streaming pass over the cost log
+
+        Accumulates per-metric cost/count plus global totals in one loop,
+        so analyze_by_metric and recommend_optimizations don't each re-read
+        the whole history. Cached until the log file changes on disk.
+        """
+        try:
+            mtime = os.path.getmtime(self.tracker.log_file)
+        except OSError:
+            mtime = None
+
+        if self._agg_cache is not None and mtime == self._agg_mtime:
+            return self._agg_cache
+
+        # Intern metric names to small integer ids and collect calls into
+        # flat arrays (SoA), then let np.bincount do the per-metric rollup
+        # at C speed instead of two dict updates per call record
+        name_to_id = {}
+        metric_ids = []
+        costs = []
+        total_cost = 0.0
+        total_calls = 0
+        run_count = 0
+
+        for run in self.tracker.get_history():
+            run_count += 1
+            total_cost += run["total_cost"]
+            total_calls += run["total_calls"]
+            calls = run["calls"]
+            # C-level extend with generator args: no per-call bytecode
+            # for the append dispatch, just the id/cost lookups
+            metric_ids.extend(
+                name_to_id.setdefault(call["metric"], len(name_to_id))
+                for call in calls
+            )
+            costs.extend(call["cost"] for call in calls)
+
+        if name_to_id:
+            ids = np.fromiter(metric_ids, np.int64, len(metric_ids))
+            cost_arr = np.fromiter(costs, np.float64, len(costs))
+            totals = np.bincount(ids, weights=cost_arr, minlength=len(name_to_id))
+            counts = np.bincount(ids, minlength=len(name_to_id))
+            metric_costs = {
+                name: [float(totals[i]), int(counts[i])]
+                for name, i in name_to_id.items()
+            }
+        else:
+            metric_costs = {}
+
+        self._agg_cache = {
+            "metric_costs": metric_costs,
+            "total_cost": total_cost,
+            "total_calls": total_calls,
+            "run_count": run_count
+        }
+        self._agg_mtime = mtime
+
+        return self._agg_cache
+
     def analyze_by_metric(self):
         """
         Find which metrics are most expensive
         """
-        
-        history = self.tracker.get_history()
-        
-        if not history:
+
+        stats = self._aggregate()
+
+        if stats["run_count"] == 0:
             print("No cost data available")
             return
-        
-        # Aggregate by metric
-        metric_costs = defaultdict(lambda: {"total_cost": 0, "call_count": 0})
-        
-        for run in history:
-            for call in run["calls"]:
-                metric = call["metric"]
-                metric_costs[metric]["total_cost"] += call["cost"]
-                metric_costs[metric]["call_count"] += 1
-        
+
         print("="*70)
         print("COST ANALYSIS BY METRIC")
         print("="*70)
-        
+
         # Sort by total cost
         sorted_metrics = sorted(
-            metric_costs.items(),
-            key=lambda x: x[1]["total_cost"],
+            stats["metric_costs"].items(),
+            key=lambda x: x[1][0],
             reverse=True
         )
-        
-        for metric, data in sorted_metrics:
-            avg_cost = data["total_cost"] / data["call_count"]
+
+        for metric, (metric_cost, call_count) in sorted_metrics:
+            avg_cost = metric_cost / call_count
             print(f"\n{metric}:")
-            print(f"  Total cost: ${data['total_cost']:.4f}")
-            print(f"  Calls: {data['call_count']}")
+            print(f"  Total cost: ${metric_cost:.4f}")
+            print(f"  Calls: {call_count}")
             print(f"  Avg per call: ${avg_cost:.4f}")
-        
+
         print("\n" + "="*70)
-    
+
     def recommend_optimizations(self):
         """
         Suggest cost reduction strategies
         """
-        
-        history = self.tracker.get_history()
-        
-        if not history:
+
+        stats = self._aggregate()
+
+        if stats["run_count"] == 0:
             return
-        
+
+        total_cost = stats["total_cost"]
+        total_calls = stats["total_calls"]
+
         print("\n" + "="*70)
         print("OPTIMIZATION RECOMMENDATIONS")
         print("="*70)
-        
-        # Calculate metrics
-        total_cost = sum(run["total_cost"] for run in history)
-        total_calls = sum(run["total_calls"] for run in history)
-        avg_per_run = total_cost / len(history) if history else 0
+
+        avg_per_run = total_cost / stats["run_count"]
         
         print(f"\n📊 Current Stats:")
         print(f"  Total spent: ${total_cost:.2f}")
@@ -303,7 +644,8 @@ def simulate_eval_runs():
     """
     
     tracker = CostTracker()
-    
+    router = ModelRouter(tracker=tracker)
+
     print("="*70)
     print("SIMULATING EVAL RUNS WITH COST TRACKING")
     print("="*70)
@@ -321,20 +663,21 @@ def simulate_eval_runs():
             ("Citation", 400, 180)       # Medium-heavy
         ]
         
-        # Simulate 10 test cases
-        for test_num in range(10):
-            for metric_name, avg_input, avg_output in metrics:
-                # Add some randomness
-                import random
-                input_tokens = int(avg_input * random.uniform(0.8, 1.2))
-                output_tokens = int(avg_output * random.uniform(0.8, 1.2))
-                
-                cost = tracker.log_api_call(
-                    model="gpt-4",
-                    input_tokens=input_tokens,
-                    output_tokens=output_tokens,
-                    metric_name=metric_name
-                )
+        # One batched draw for all (test, metric, input/output) jitter
+        # instead of two random.uniform() calls per API call
+        jitter = np.random.uniform(0.8, 1.2, (10, len(metrics), 2))
+
+        # Simulate 10 test cases per metric as one batched log call
+        for metric_idx, (metric_name, avg_input, avg_output) in enumerate(metrics):
+            input_tokens = (avg_input * jitter[:, metric_idx, 0]).astype(np.int64)
+            output_tokens = (avg_output * jitter[:, metric_idx, 1]).astype(np.int64)
+
+            tracker.log_api_calls_batch(
+                model=router.route(metric_name),
+                input_tokens_arr=input_tokens,
+                output_tokens_arr=output_tokens,
+                metric_name=metric_name
+            )
         
         # Save run
         summary = tracker.save_run({
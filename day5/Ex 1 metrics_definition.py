@@ -12,6 +12,7 @@ As a PM, you need to balance multiple success criteria:
 from deepeval.metrics import BaseMetric
 from deepeval.test_case import LLMTestCase
 from deepeval import evaluate
+import numpy as np
 import os
 
 # Set your API key
@@ -47,7 +48,71 @@ class CustomerSupportMetrics:
             'safety': 0.25,     # Critical for risk management
             'efficiency': 0.05  # Nice to have
         }
-    
+
+        # Vectorized mirrors of the dicts above: a fixed column order plus
+        # weight/threshold vectors, so a whole batch of scenarios can be
+        # scored with a couple of matrix ops instead of per-dict loops.
+        self._metric_order = ('accuracy', 'empathy', 'routing', 'safety', 'efficiency')
+        self._safety_idx = self._metric_order.index('safety')
+        self._accuracy_idx = self._metric_order.index('accuracy')
+        self._weights_vec = np.array(
+            [self.weights[m] for m in self._metric_order], np.float64
+        )
+        self._thresh_vec = np.array(
+            [self.thresholds[m] for m in self._metric_order], np.float64
+        )
+
+    def to_score_matrix(self, score_dicts):
+        """
+        Stack a list of per-scenario score dicts into an (N, M) array
+
+        Columns follow self._metric_order; missing metrics become NaN,
+        which the consumers below treat exactly like the dict-based
+        path treats an absent key: contributes 0 to the weighted sum,
+        never clears a threshold, and never triggers the safety
+        override. float64 throughout - float32 rounding could flip a
+        verdict sitting exactly on the 0.75 composite boundary.
+        """
+        return np.array(
+            [[s.get(m, np.nan) for m in self._metric_order] for s in score_dicts],
+            np.float64
+        )
+
+    def batch_composite(self, score_matrix):
+        """
+        Composite scores for a whole (N, M) batch in one shot
+
+        Same semantics as calculate_composite_score: weighted average,
+        zeroed out wherever safety misses its threshold (a NaN safety
+        column means "not scored" and, like the dict path's
+        scores.get('safety', 1.0), does NOT trigger the override). One
+        matrix-vector product plus a mask replaces N Python dict loops -
+        the difference between milliseconds and minutes when replaying
+        thousands of historic runs.
+        """
+        score_matrix = np.asarray(score_matrix, np.float64)
+        weighted = np.nan_to_num(score_matrix) @ self._weights_vec
+        # NaN < threshold is False, so missing safety skips the override
+        safety_fail = score_matrix[:, self._safety_idx] < self.thresholds['safety']
+        return np.where(safety_fail, 0.0, weighted)
+
+    def batch_pass_fail(self, score_matrix):
+        """
+        Vectorized ship/no-ship decisions - returns an (N,) bool array
+
+        Mirrors get_pass_fail_decision: safety and accuracy must clear
+        their thresholds AND the composite must reach 0.75. A NaN
+        (unscored) safety or accuracy fails its >= check, matching the
+        dict path's scores.get(metric, 0).
+        """
+        score_matrix = np.asarray(score_matrix, np.float64)
+        composite = self.batch_composite(score_matrix)
+        critical_pass = (
+            (score_matrix[:, self._safety_idx] >= self.thresholds['safety'])
+            & (score_matrix[:, self._accuracy_idx] >= self.thresholds['accuracy'])
+        )
+        return critical_pass & (composite >= 0.75)
+
     def calculate_composite_score(self, scores):
         """
         PM DECISION: How do you combine multiple dimensions?
@@ -60,16 +125,16 @@ class CustomerSupportMetrics:
         We're using weighted average with safety override
         """
         # Safety override: If safety fails, entire evaluation fails
+        # (a missing safety score doesn't trigger the override)
         if scores.get('safety', 1.0) < self.thresholds['safety']:
             return 0.0  # Automatic failure
-        
-        # Calculate weighted average for other metrics
-        weighted_sum = sum(
-            scores.get(metric, 0) * weight 
-            for metric, weight in self.weights.items()
+
+        # Weighted average via the same vector the batch path uses,
+        # so single-case and batch scoring can never drift apart
+        # (nan_to_num zeroes any unscored metrics, like scores.get(m, 0))
+        return float(
+            np.nan_to_num(self.to_score_matrix([scores])[0]) @ self._weights_vec
         )
-        
-        return weighted_sum
     
     def get_pass_fail_decision(self, scores):
         """
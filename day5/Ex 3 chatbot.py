@@ -4,13 +4,8 @@ Exercise 5.3:Simple customer support chatbot
 This is what we'll EVALUATE using our golden dataset
 """
 
-import os
-from openai import OpenAI
-
-# Set your API key
-os.environ['OPENAI_API_KEY'] = ''
-
-client = OpenAI()
+import llm_cache
+from openai_client import async_client, client
 
 class CustomerSupportBot:
     """
@@ -56,41 +51,68 @@ Good (balanced):
 "I understand how frustrating billing issues can be. To cancel your subscription, go to Settings > Billing > Cancel Subscription. Your data will be retained for 30 days in case you want to reactivate. Is there anything I can help resolve before you cancel?"
 
 Keep responses concise (2-4 sentences) but complete."""
+
+        # Frozen system-message prefix, built once. Every call reuses the
+        # same dict object instead of re-allocating it, and keeping the
+        # static prefix byte-identical across requests is what lets the
+        # provider's prompt caching discount kick in on those tokens.
+        self._base_messages = (
+            {"role": "system", "content": self.system_prompt},
+        )
+
+    def _build_messages(self, user_input: str, context: dict = None) -> list:
+        """Assemble the message list shared by the sync and async paths"""
+        messages = list(self._base_messages)
+
+        # Add context if provided
+        if context:
+            context_str = "\n".join([f"{k}: {v}" for k, v in context.items()])
+            messages.append({
+                "role": "system",
+                "content": f"User context:\n{context_str}"
+            })
+
+        # Add user's question
+        messages.append({"role": "user", "content": user_input})
+
+        return messages
+
     def get_response(self, user_input: str, context: dict = None) -> str:
         """
         Generate chatbot response
-        
+
         Args:
             user_input: Customer's question
             context: Background info about user
-        
+
         Returns:
             Chatbot's response
         """
-        messages = [
-            {"role": "system", "content": self.system_prompt}
-        ]
-        
-        # Add context if provided
-        if context:
-            context_str = "\n".join([f"{k}: {v}" for k, v in context.items()])
-            messages.append({
-                "role": "system", 
-                "content": f"User context:\n{context_str}"
-            })
-        
-        # Add user's question
-        messages.append({"role": "user", "content": user_input})
-        
-        # Get response from GPT-4
-        response = client.chat.completions.create(
+        # Get response from GPT-4 (served from the on-disk cache when we've
+        # asked this exact question before - free and instant on re-runs)
+        return llm_cache.get_or_call(
+            client,
+            model="gpt-4",
+            messages=self._build_messages(user_input, context),
+            temperature=0.7,
+            max_tokens=300
+        )
+
+    async def get_response_async(self, user_input: str, context: dict = None) -> str:
+        """
+        Async variant of get_response
+
+        Lets an evaluation harness issue many chatbot calls concurrently -
+        the workload is network-latency-bound, so overlapping requests
+        cuts wall time roughly linearly with concurrency.
+        """
+        return await llm_cache.get_or_call_async(
+            async_client,
             model="gpt-4",
-            messages=messages,
+            messages=self._build_messages(user_input, context),
             temperature=0.7,
             max_tokens=300
         )
-        
-        return response.choices[0].message.content
 
 # Test it
 if __name__ == "__main__":
@@ -3,13 +3,12 @@
 Exercise 5.4: Automated Three Gulfs Classifier - ANALYZES ALL METRIC FAILURES
 """
 
-import json
-import os
-from openai import OpenAI
+import heapq
 
-os.environ['OPENAI_API_KEY'] = ''
+import orjson
 
-client = OpenAI()
+import llm_cache
+from openai_client import client
 
 class GulfClassifier:
     
@@ -19,6 +18,11 @@ class GulfClassifier:
             'empathy': 0.7,
             'safety': 0.95
         }
+
+        # Flattened (name, threshold) pairs for the hot loop in
+        # get_all_metric_failures - tuple iteration beats per-result
+        # dict method lookups on large result sets
+        self._metric_thresh = tuple(self.thresholds.items())
         
         self.classification_prompt = """You are an expert at diagnosing LLM failures using the Three Gulfs Framework.
 
@@ -35,17 +39,26 @@ Return ONLY a JSON object:
   "recommended_fix": "specific action"
 }
 """
-    
+
+        # Frozen system-message prefix (built once, reused per call) -
+        # keeps the static prefix identical across requests so provider
+        # prompt caching discounts it
+        self._base_messages = (
+            {"role": "system", "content": self.classification_prompt},
+        )
+
+
     def get_all_metric_failures(self, results):
         """
         Find EVERY metric that scored below threshold
         """
         metric_failures = []
-        
+
         for result in results:
-            for metric_name, threshold in self.thresholds.items():
-                score = result['scores'][metric_name]
-                
+            scores = result['scores']
+            for metric_name, threshold in self._metric_thresh:
+                score = scores[metric_name]
+
                 if score < threshold:
                     metric_failures.append({
                         'test_case': result,
@@ -77,16 +90,23 @@ FAILED: {metric} = {score:.2f} (threshold: {threshold})
 Why did {metric} fail? Classify by Three Gulfs Framework.
 """
         
-        response = client.chat.completions.create(
-            model="gpt-4",
+        # Cached: re-running the analysis on the same failures is free.
+        # JSON mode forces pure JSON output - no markdown fences or prose
+        # to strip, no crash-retries on malformed responses, and slightly
+        # fewer completion tokens. It needs a 1106+/turbo-family judge:
+        # base gpt-4 rejects the response_format parameter outright.
+        content = llm_cache.get_or_call(
+            client,
+            model="gpt-4-turbo",
             messages=[
-                {"role": "system", "content": self.classification_prompt},
+                *self._base_messages,
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.3
+            temperature=0.3,
+            response_format={"type": "json_object"}
         )
-        
-        result = json.loads(response.choices[0].message.content)
+
+        result = orjson.loads(content)
         
         return {
             'test_id': tc['id'],
@@ -104,8 +124,10 @@ Why did {metric} fail? Classify by Three Gulfs Framework.
         """
         Main analysis function
         """
-        with open(results_file, 'r') as f:
-            results = json.load(f)
+        # orjson: C-level parse, several times faster than stdlib json
+        # on large result files
+        with open(results_file, 'rb') as f:
+            results = orjson.loads(f.read())
         
         # Get ALL metric failures
         metric_failures = self.get_all_metric_failures(results)
@@ -113,16 +135,22 @@ Why did {metric} fail? Classify by Three Gulfs Framework.
         print(f"Found {len(metric_failures)} metric failures")
         print("=" * 80)
         
-        # Classify each (this will take a while - 30 API calls)
+        # Classify each (this will take a while - 30 API calls).
+        # Per-failure detail is buffered and printed once at the end:
+        # three flushed print() calls per item add up on big result sets.
         classifications = []
+        progress_lines = []
         for i, mf in enumerate(metric_failures, 1):
-            print(f"\n[{i}/{len(metric_failures)}] {mf['test_case']['id']} - {mf['failed_metric']}")
-            print(f"  Score: {mf['score']:.2f} (gap: {mf['gap']:.2f})")
-            
             classification = self.classify_metric_failure(mf)
             classifications.append(classification)
-            
-            print(f"  Gulf: {classification['gulf_type']} ({classification['confidence']:.2f})")
+
+            progress_lines.append(
+                f"\n[{i}/{len(metric_failures)}] {mf['test_case']['id']} - {mf['failed_metric']}\n"
+                f"  Score: {mf['score']:.2f} (gap: {mf['gap']:.2f})\n"
+                f"  Gulf: {classification['gulf_type']} ({classification['confidence']:.2f})"
+            )
+
+        print(''.join(progress_lines))
         
         # Summary
         self.print_summary(classifications)
@@ -142,21 +170,27 @@ Why did {metric} fail? Classify by Three Gulfs Framework.
         
         total = len(classifications)
         print(f"\nTotal metric failures analyzed: {total}")
-        
+
+        # All three distributions in ONE pass over the classifications
+        # (three separate Counter() generator sweeps walked the same
+        # list three times - needlessly cache-unfriendly at scale)
+        gulfs, metrics, categories = Counter(), Counter(), Counter()
+        for c in classifications:
+            gulfs[c['gulf_type']] += 1
+            metrics[c['failed_metric']] += 1
+            categories[c['category']] += 1
+
         # Gulf distribution
-        gulfs = Counter(c['gulf_type'] for c in classifications)
         print(f"\nGulf Distribution:")
         for gulf, count in gulfs.items():
             print(f"  {gulf}: {count} ({count/total*100:.1f}%)")
-        
+
         # Metric distribution
-        metrics = Counter(c['failed_metric'] for c in classifications)
         print(f"\nMetric Distribution:")
         for metric, count in metrics.items():
             print(f"  {metric}: {count} ({count/total*100:.1f}%)")
-        
+
         # Category distribution
-        categories = Counter(c['category'] for c in classifications)
         print(f"\nCategory Distribution:")
         for cat, count in categories.items():
             print(f"  {cat}: {count} ({count/total*100:.1f}%)")
@@ -165,9 +199,10 @@ Why did {metric} fail? Classify by Three Gulfs Framework.
         primary = gulfs.most_common(1)[0][0]
         print(f"\n🎯 PRIMARY ISSUE: {primary.upper()} Gulf")
         
-        # Top fixes (by gap size)
+        # Top fixes (by gap size) - nlargest keeps a 5-element heap
+        # instead of sorting every classification just to show five
         print(f"\n⚡ TOP 5 PRIORITY FIXES:")
-        top_fixes = sorted(classifications, key=lambda x: x['gap'], reverse=True)[:5]
+        top_fixes = heapq.nlargest(5, classifications, key=lambda x: x['gap'])
         for i, fix in enumerate(top_fixes, 1):
             print(f"{i}. {fix['test_id']}: {fix['failed_metric']} (gap: {fix['gap']:.2f})")
             print(f"   {fix['fix'][:80]}...")
@@ -176,8 +211,8 @@ Why did {metric} fail? Classify by Three Gulfs Framework.
         """
         Save to file
         """
-        with open('gulf_analysis_detailed.json', 'w') as f:
-            json.dump(classifications, f, indent=2)
+        with open('gulf_analysis_detailed.json', 'wb') as f:
+            f.write(orjson.dumps(classifications, option=orjson.OPT_INDENT_2))
         print(f"\n✓ Saved to gulf_analysis_detailed.json")
 
 if __name__ == "__main__":
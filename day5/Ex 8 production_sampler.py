@@ -8,17 +8,38 @@ PM DECISIONS:
 - How to stay within budget?
 """
 
-import random
+import io
+import re
+import statistics
+import sys
+from collections import defaultdict
 from typing import List, Dict
 from datetime import datetime
 
+import numpy as np
+
+# Priority tiers, built once at import: frozenset membership is O(1)
+# per lookup versus a linear scan of a list rebuilt on every call.
+# np.isin can't consume sets, so the vectorized path uses sorted lists.
+_HIGH_PRIORITY = frozenset({'billing', 'escalation', 'security'})
+_MEDIUM_PRIORITY = frozenset({'technical', 'account'})
+_HIGH_PRIORITY_LIST = sorted(_HIGH_PRIORITY)
+_MEDIUM_PRIORITY_LIST = sorted(_MEDIUM_PRIORITY)
+
+
 class ProductionSampler:
     """
     Smart sampling for production traffic
     
     GOAL: Get quality visibility without evaluating everything
     """
-    
+
+    # Angry-customer signals as ONE precompiled case-insensitive regex:
+    # a single scan per text, instead of a .lower() copy plus up to four
+    # separate substring searches
+    _ANGRY_RE = re.compile(r'ridiculous|terrible|sue|complaint', re.IGNORECASE)
+
+
     def __init__(self, monthly_budget: float = 500.0):
         self.monthly_budget = monthly_budget
         self.cost_per_eval = 0.06  # $0.06 per evaluation
@@ -31,6 +52,14 @@ class ProductionSampler:
         print(f"   Monthly: ${monthly_budget}")
         print(f"   Daily: ${self.daily_budget:.2f}")
         print(f"   Daily eval limit: {self.daily_eval_limit} evaluations")
+
+        # Historical pass rates per category, fed by record_pass_rate -
+        # strategy 5 uses their spread to decide where evals pay off
+        self._category_stats = defaultdict(list)
+
+    def record_pass_rate(self, category: str, pass_rate: float):
+        """Record an observed pass rate for a category (feeds strategy 5)"""
+        self._category_stats[category].append(pass_rate)
     
     def strategy_1_random_sampling(self, daily_requests: int) -> dict:
         """
@@ -68,7 +97,43 @@ class ProductionSampler:
             'coverage': sample_rate * 100
         }
     
-    def strategy_2_priority_sampling(self, requests: List[Dict]) -> dict:
+    def _summarize(self, requests: List[Dict]) -> dict:
+        """
+        One shared pass over the day's requests
+
+        Every per-request strategy needs some slice of the same facts:
+        category, angry wording, text length, user history. Running
+        strategies back to back used to traverse the full request list
+        once each; this extracts everything in a single streaming pass
+        and each strategy reduces over the shared arrays. Pass the
+        result via the strategies' summary argument.
+        """
+        n = len(requests)
+        categories = []
+        counts = defaultdict(int)
+        angry = np.empty(n, dtype=bool)
+        lengths = np.empty(n, dtype=np.int64)
+        history = np.empty(n, dtype=np.int64)
+
+        for i, req in enumerate(requests):
+            cat = req.get('category', 'unknown')
+            text = req.get('text', '')
+            categories.append(cat)
+            counts[cat] += 1
+            angry[i] = self._ANGRY_RE.search(text) is not None
+            lengths[i] = len(text)
+            history[i] = req.get('user_history_count', 0)
+
+        return {
+            'n': n,
+            'categories': np.array(categories),
+            'category_counts': dict(counts),
+            'angry': angry,
+            'lengths': lengths,
+            'history': history,
+        }
+
+    def strategy_2_priority_sampling(self, requests: List[Dict], summary: dict = None) -> dict:
         """
         STRATEGY 2: Priority-Based Sampling
         
@@ -87,40 +152,68 @@ class ProductionSampler:
         
         PM DECISION: How to prioritize?
         """
-        high_priority = ['billing', 'escalation', 'security']
-        medium_priority = ['technical', 'account']
-        # low_priority = everything else
-        
-        sampled = []
-        
-        for req in requests:
-            category = req.get('category', 'unknown')
-            
-            if category in high_priority:
-                # Always sample high-priority
-                sampled.append(req)
-            elif category in medium_priority:
-                # Sample 50% of medium
-                if random.random() < 0.5:
-                    sampled.append(req)
-            else:
-                # Sample 10% of low-priority
-                if random.random() < 0.1:
-                    sampled.append(req)
-        
-        cost = len(sampled) * self.cost_per_eval
-        
+        # Vectorized decision: one categories array, per-category rates
+        # via np.select, one batched RNG draw. The old per-request loop
+        # (dict get + membership test + random.random() each) was pure
+        # interpreter overhead at production volumes.
+        summary = summary or self._summarize(requests)
+        n = summary['n']
+        rates = np.select(
+            [np.isin(summary['categories'], _HIGH_PRIORITY_LIST),
+             np.isin(summary['categories'], _MEDIUM_PRIORITY_LIST)],
+            [1.0, 0.5],  # always keep high, half of medium
+            default=0.1  # 10% of everything else
+        )
+        keep = np.random.random(n) < rates
+        sampled = int(keep.sum())
+
+        cost = sampled * self.cost_per_eval
+
         return {
             'strategy': 'Priority-Based Sampling',
-            'total_requests': len(requests),
-            'sampled': len(sampled),
-            'skipped': len(requests) - len(sampled),
+            'total_requests': n,
+            'sampled': sampled,
+            'skipped': n - sampled,
             'daily_cost': cost,
             'monthly_cost': cost * 30,
-            'coverage': (len(sampled) / len(requests)) * 100
+            'coverage': (sampled / n) * 100
         }
     
-    def strategy_3_failure_focused(self, requests: List[Dict]) -> dict:
+    def strategy_2_priority_sampling_from_counts(self, category_counts: Dict[str, int]) -> dict:
+        """
+        Priority sampling from per-category COUNTS - no request objects
+
+        A day of traffic only enters the priority decision through its
+        category, so a {category: count} histogram carries everything
+        the strategy needs. And since the report only shows VOLUMES, by
+        linearity of expectation the answer is exact arithmetic:
+        E[sampled] = n_high + 0.5*n_med + 0.1*n_low. No RNG at all,
+        O(categories) work, and the same numbers every run. Use the
+        per-request strategy_2_priority_sampling when you need the
+        actual sampled subset.
+        """
+        total = sum(category_counts.values())
+        n_high = sum(count for cat, count in category_counts.items()
+                     if cat in _HIGH_PRIORITY)
+        n_med = sum(count for cat, count in category_counts.items()
+                    if cat in _MEDIUM_PRIORITY)
+        n_low = total - n_high - n_med
+
+        sampled = n_high + 0.5 * n_med + 0.1 * n_low
+
+        cost = sampled * self.cost_per_eval
+
+        return {
+            'strategy': 'Priority-Based Sampling',
+            'total_requests': total,
+            'sampled': sampled,
+            'skipped': total - sampled,
+            'daily_cost': cost,
+            'monthly_cost': cost * 30,
+            'coverage': (sampled / total) * 100
+        }
+
+    def strategy_3_failure_focused(self, requests: List[Dict], summary: dict = None) -> dict:
         """
         STRATEGY 3: Failure-Focused Sampling
         
@@ -140,44 +233,33 @@ class ProductionSampler:
         
         PM DECISION: What signals indicate likely failure?
         """
-        sampled = []
-        
-        for req in requests:
-            # Check failure indicators
-            should_sample = False
-            
-            # Angry customer signals
-            if any(word in req.get('text', '').lower() for word in ['ridiculous', 'terrible', 'sue', 'complaint']):
-                should_sample = True
-            
-            # Complex question
-            if len(req.get('text', '')) > 100:
-                should_sample = True
-            
-            # New user
-            if req.get('user_history_count', 0) < 3:
-                should_sample = True
-            
-            # Random sample of rest (10%)
-            if not should_sample and random.random() < 0.1:
-                should_sample = True
-            
-            if should_sample:
-                sampled.append(req)
-        
-        cost = len(sampled) * self.cost_per_eval
-        
+        # Each failure signal is a boolean array over the shared
+        # summary; the sampling decision is three vectorized ORs plus
+        # one batched RNG draw instead of four checks per request
+        summary = summary or self._summarize(requests)
+        n = summary['n']
+
+        flagged = (summary['angry']
+                   | (summary['lengths'] > 100)   # complex question
+                   | (summary['history'] < 3))    # new user
+
+        # Random sample of the rest (10%)
+        keep = flagged | (np.random.random(n) < 0.1)
+        sampled = int(keep.sum())
+
+        cost = sampled * self.cost_per_eval
+
         return {
             'strategy': 'Failure-Focused Sampling',
-            'total_requests': len(requests),
-            'sampled': len(sampled),
-            'skipped': len(requests) - len(sampled),
+            'total_requests': n,
+            'sampled': sampled,
+            'skipped': n - sampled,
             'daily_cost': cost,
             'monthly_cost': cost * 30,
-            'coverage': (len(sampled) / len(requests)) * 100
+            'coverage': (sampled / n) * 100
         }
     
-    def strategy_4_adaptive_sampling(self, requests: List[Dict], recent_pass_rate: float) -> dict:
+    def strategy_4_adaptive_sampling(self, total_requests: int, recent_pass_rate: float) -> dict:
         """
         STRATEGY 4: Adaptive Sampling
         
@@ -195,32 +277,27 @@ class ProductionSampler:
         
         PM DECISION: How to balance reactivity vs cost?
         """
-        # Adjust sample rate based on recent quality
-        if recent_pass_rate >= 0.95:
-            # Quality excellent: reduce sampling
-            sample_rate = 0.05  # 5%
-            reason = "Quality excellent (≥95%), reducing sampling"
-        elif recent_pass_rate >= 0.85:
-            # Quality good: normal sampling
-            sample_rate = 0.10  # 10%
-            reason = "Quality good (85-95%), normal sampling"
-        elif recent_pass_rate >= 0.75:
-            # Quality concerning: increase sampling
-            sample_rate = 0.25  # 25%
-            reason = "Quality concerning (75-85%), increasing sampling"
-        else:
-            # Quality poor: maximum sampling
-            sample_rate = 0.50  # 50%
-            reason = "Quality poor (<75%), maximum sampling for investigation"
-        
-        sampled = int(len(requests) * sample_rate)
+        # Closed-form rate: scale with how far quality has fallen,
+        # clipped to [5%, 50%]. The old 4-step if/elif ladder jumped
+        # from 10% to 25% between a 0.8500 and a 0.8499 pass rate; this
+        # is monotonic and boundary-stable, and k=1.5 is calibrated so
+        # a 95% pass rate samples ~7.5% and anything at or below ~67%
+        # hits the 50% ceiling.
+        k = 1.5
+        min_rate, max_rate = 0.05, 0.50
+        sample_rate = min(max_rate, max(min_rate, k * (1 - recent_pass_rate)))
+        reason = (f"Sampling {sample_rate:.0%} - scaled to recent pass rate "
+                  f"{recent_pass_rate:.0%} (rate = 1.5 x failure rate, "
+                  f"clipped to 5-50%)")
+        
+        sampled = int(total_requests * sample_rate)
         cost = sampled * self.cost_per_eval
-        
+
         return {
             'strategy': 'Adaptive Sampling',
-            'total_requests': len(requests),
+            'total_requests': total_requests,
             'sampled': sampled,
-            'skipped': len(requests) - sampled,
+            'skipped': total_requests - sampled,
             'sample_rate': sample_rate,
             'daily_cost': cost,
             'monthly_cost': cost * 30,
@@ -229,47 +306,122 @@ class ProductionSampler:
             'recent_pass_rate': recent_pass_rate
         }
     
+    def strategy_5_neyman(self, requests: List[Dict], budget: int = None,
+                          summary: dict = None) -> dict:
+        """
+        STRATEGY 5: Neyman-Style Optimal Allocation
+
+        WHAT: Spend the eval budget where results are most UNCERTAIN
+        - Track historical pass rates per category
+        - Categories with volatile pass rates get more evals
+        - Categories that always pass (or always fail) get fewer
+
+        Allocation: m_cat = sigma_cat * budget / sum(sigma), where sigma
+        is the stddev of that category's historical pass rates. Fixed
+        100/50/10% tiers waste budget re-confirming stable categories.
+
+        PROS:
+        - Lowest-variance pass-rate estimates per dollar
+        - Self-correcting as history accumulates
+
+        CONS:
+        - Needs pass-rate history to work (bootstraps as uniform)
+        - Allocation must be re-derived as categories shift
+
+        PM DECISION: How much history before trusting the allocation?
+        """
+        if budget is None:
+            budget = self.daily_eval_limit
+
+        # Request counts per category from the shared summary
+        summary = summary or self._summarize(requests)
+        n = summary['n']
+        group_sizes = summary['category_counts']
+
+        # Spread of each category's historical pass rate, floored so a
+        # perfectly stable (or unseen) category still gets some coverage.
+        # With no history at all this degrades to a uniform split - the
+        # bootstrap pass that seeds the stats for the next allocation.
+        epsilon = 0.05
+        sigma = {
+            cat: max(statistics.pstdev(stats), epsilon) if len(stats) >= 2
+            else epsilon
+            for cat, stats in
+            ((cat, self._category_stats.get(cat, [])) for cat in group_sizes)
+        }
+        sigma_total = sum(sigma.values())
+
+        # Proportional allocation, capped at each group's actual size
+        allocation = {
+            cat: min(int(sigma[cat] * budget / sigma_total), group_sizes[cat])
+            for cat in group_sizes
+        }
+        sampled = sum(allocation.values())
+
+        cost = sampled * self.cost_per_eval
+
+        return {
+            'strategy': 'Neyman Optimal Allocation',
+            'total_requests': n,
+            'sampled': sampled,
+            'skipped': n - sampled,
+            'allocation': allocation,
+            'daily_cost': cost,
+            'monthly_cost': cost * 30,
+            'coverage': (sampled / n) * 100
+        }
+
     def compare_strategies(self, daily_requests: int = 1000):
         """
         PM TOOL: Compare all strategies
+
+        Output is assembled in a StringIO and written to stdout once -
+        one lock acquire and one flush for the whole comparison instead
+        of one per print line.
         """
-        print("\n" + "=" * 80)
-        print("SAMPLING STRATEGY COMPARISON")
-        print(f"Daily Requests: {daily_requests}")
-        print(f"Budget Limit: ${self.daily_budget:.2f}/day")
-        print("=" * 80)
-        
+        buf = io.StringIO()
+        buf.write("\n" + "=" * 80 + "\n")
+        buf.write("SAMPLING STRATEGY COMPARISON\n")
+        buf.write(f"Daily Requests: {daily_requests}\n")
+        buf.write(f"Budget Limit: ${self.daily_budget:.2f}/day\n")
+        buf.write("=" * 80 + "\n")
+
         # Strategy 1: Random
         random_result = self.strategy_1_random_sampling(daily_requests)
-        print(f"\n📊 {random_result['strategy']}")
-        print(f"   Sample rate: {random_result['sample_rate']*100:.1f}%")
-        print(f"   Evaluations: {random_result['sampled']}/{daily_requests}")
-        print(f"   Cost: ${random_result['daily_cost']:.2f}/day (${random_result['monthly_cost']:.2f}/month)")
-        
+        buf.write(f"\n📊 {random_result['strategy']}\n")
+        buf.write(f"   Sample rate: {random_result['sample_rate']*100:.1f}%\n")
+        buf.write(f"   Evaluations: {random_result['sampled']}/{daily_requests}\n")
+        buf.write(f"   Cost: ${random_result['daily_cost']:.2f}/day (${random_result['monthly_cost']:.2f}/month)\n")
+
         # Strategy 2: Priority
-        # Simulate requests with categories
-        sim_requests = [
-            {'category': random.choice(['billing', 'technical', 'how-to', 'escalation'])}
-            for _ in range(daily_requests)
-        ]
-        priority_result = self.strategy_2_priority_sampling(sim_requests)
-        print(f"\n📊 {priority_result['strategy']}")
-        print(f"   Evaluations: {priority_result['sampled']}/{daily_requests}")
-        print(f"   Cost: ${priority_result['daily_cost']:.2f}/day (${priority_result['monthly_cost']:.2f}/month)")
-        
+        # Simulate the day's category mix as a histogram - the strategy
+        # only looks at categories, so there's no reason to allocate a
+        # dict per simulated request (1M requests would be ~200MB)
+        sim_counts = dict(zip(
+            ['billing', 'technical', 'how-to', 'escalation'],
+            (int(c) for c in np.random.multinomial(
+                daily_requests, [0.25, 0.25, 0.25, 0.25]))
+        ))
+        priority_result = self.strategy_2_priority_sampling_from_counts(sim_counts)
+        buf.write(f"\n📊 {priority_result['strategy']}\n")
+        buf.write(f"   Evaluations: {priority_result['sampled']:.0f}/{daily_requests} (expected)\n")
+        buf.write(f"   Cost: ${priority_result['daily_cost']:.2f}/day (${priority_result['monthly_cost']:.2f}/month)\n")
+
         # Strategy 4: Adaptive (assuming good quality)
-        adaptive_result = self.strategy_4_adaptive_sampling(sim_requests, recent_pass_rate=0.90)
-        print(f"\n📊 {adaptive_result['strategy']}")
-        print(f"   Sample rate: {adaptive_result['sample_rate']*100:.1f}%")
-        print(f"   Evaluations: {adaptive_result['sampled']}/{daily_requests}")
-        print(f"   Cost: ${adaptive_result['daily_cost']:.2f}/day (${adaptive_result['monthly_cost']:.2f}/month)")
-        print(f"   Reason: {adaptive_result['reason']}")
-        
-        print("\n" + "=" * 80)
-        print("💡 PM RECOMMENDATION:")
-        print("   Start with: Priority-Based (focus on revenue/risk)")
-        print("   Evolve to: Adaptive (dynamic based on quality)")
-        print("=" * 80)
+        adaptive_result = self.strategy_4_adaptive_sampling(daily_requests, recent_pass_rate=0.90)
+        buf.write(f"\n📊 {adaptive_result['strategy']}\n")
+        buf.write(f"   Sample rate: {adaptive_result['sample_rate']*100:.1f}%\n")
+        buf.write(f"   Evaluations: {adaptive_result['sampled']}/{daily_requests}\n")
+        buf.write(f"   Cost: ${adaptive_result['daily_cost']:.2f}/day (${adaptive_result['monthly_cost']:.2f}/month)\n")
+        buf.write(f"   Reason: {adaptive_result['reason']}\n")
+
+        buf.write("\n" + "=" * 80 + "\n")
+        buf.write("💡 PM RECOMMENDATION:\n")
+        buf.write("   Start with: Priority-Based (focus on revenue/risk)\n")
+        buf.write("   Evolve to: Adaptive (dynamic based on quality)\n")
+        buf.write("=" * 80 + "\n")
+
+        sys.stdout.write(buf.getvalue())
 
 # Run comparison
 if __name__ == "__main__":
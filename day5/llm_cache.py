@@ -0,0 +1,165 @@
+# day5/llm_cache.py
+"""
+Persistent on-disk cache for LLM calls
+
+During dev/CI the same prompts hit GPT-4 over and over: the chatbot gets
+identical inputs from the golden dataset, the evaluator re-judges the same
+responses, the gulf classifier re-analyzes the same failures. Every one of
+those repeats pays multi-second latency and real money for an answer we
+already have on disk.
+
+This module wraps chat.completions.create with a SQLite cache keyed on a
+hash of (model, messages, sampling params). Cache hits return instantly
+and cost $0 - re-running the full eval suite after a no-op change becomes
+free. A second table caches judge scores so re-scoring a response (e.g.
+after a threshold change) never re-invokes the judge at all.
+
+Delete llm_cache.sqlite to force fresh API calls.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+from openai import APIConnectionError, APITimeoutError, RateLimitError
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+CACHE_FILE = 'llm_cache.sqlite'
+
+# Concurrent eval runs (thread pools / async pools) naturally trip 429s;
+# back off exponentially instead of failing the whole run.
+_retry_transient = retry(
+    retry=retry_if_exception_type(
+        (RateLimitError, APIConnectionError, APITimeoutError)
+    ),
+    wait=wait_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
+
+_conn = None
+_lock = threading.Lock()  # one connection shared across worker threads
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        # check_same_thread=False because the async eval suite scores
+        # metrics from worker threads; _lock serializes access.
+        _conn = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response TEXT)"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL)"
+        )
+        _conn.commit()
+    return _conn
+
+
+def _cache_key(model, messages, **kwargs):
+    """Stable hash of everything that affects the completion"""
+    payload = json.dumps(
+        {'model': model, 'messages': messages, **kwargs},
+        sort_keys=True
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def get_or_call(client, model, messages, **kwargs):
+    """
+    Cached chat completion - returns the response text
+
+    On a cache hit this is a local SQLite lookup (microseconds, $0).
+    On a miss it calls the API and stores the result for next time.
+    """
+    key = _cache_key(model, messages, **kwargs)
+
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT response FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+    if row is not None:
+        return row[0]
+
+    @_retry_transient
+    def _create():
+        return client.chat.completions.create(
+            model=model, messages=messages, **kwargs
+        )
+
+    content = _create().choices[0].message.content
+
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, response) VALUES (?, ?)",
+            (key, content)
+        )
+        conn.commit()
+
+    return content
+
+
+async def get_or_call_async(client, model, messages, **kwargs):
+    """Async twin of get_or_call for AsyncOpenAI clients"""
+    key = _cache_key(model, messages, **kwargs)
+
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT response FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+    if row is not None:
+        return row[0]
+
+    @_retry_transient
+    async def _create():
+        return await client.chat.completions.create(
+            model=model, messages=messages, **kwargs
+        )
+
+    content = (await _create()).choices[0].message.content
+
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, response) VALUES (?, ?)",
+            (key, content)
+        )
+        conn.commit()
+
+    return content
+
+
+def score_key(metric_name, input_text, actual_output, expected_output):
+    """Hash identifying one (metric, response) judging decision"""
+    payload = '\x00'.join([
+        metric_name, input_text, actual_output, expected_output or ''
+    ])
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def get_score(key):
+    """Return a cached judge score, or None if never judged"""
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT score FROM scores WHERE key = ?", (key,)
+        ).fetchone()
+    return row[0] if row is not None else None
+
+
+def put_score(key, score):
+    """Remember a judge score so re-evaluation never re-judges"""
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)",
+            (key, score)
+        )
+        conn.commit()